@@ -7,18 +7,15 @@ def calculate_psnr(img1, img2):
     """
     計算兩張圖片的 PSNR (Peak Signal-to-Noise Ratio)
     """
-    # 1. 轉換為 float64 以防止平方運算溢位
-    img1 = img1.astype(np.float64)
-    img2 = img2.astype(np.float64)
+    # 1. 用 OpenCV 內建的 SIMD 版 L2 norm 直接算平方差總和，
+    #    不用先轉 float64、也不用生出整張圖的平方差暫存陣列
+    mse = cv2.norm(img1, img2, cv2.NORM_L2SQR) / img1.size
 
-    # 2. 計算 MSE (Mean Squared Error)
-    mse = np.mean((img1 - img2) ** 2)
-
-    # 3. 若 MSE 為 0，代表兩張圖完全一樣 (PSNR 為無限大)
+    # 2. 若 MSE 為 0，代表兩張圖完全一樣 (PSNR 為無限大)
     if mse == 0:
         return float('inf')
 
-    # 4. 計算 PSNR (像素最大值為 255)
+    # 3. 計算 PSNR (像素最大值為 255)
     psnr = 20 * math.log10(255.0 / math.sqrt(mse))
     return psnr
 
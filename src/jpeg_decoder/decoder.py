@@ -1,7 +1,159 @@
 import numpy as np
 import math
 from .reader import data_reader
-from .image import Image, Color
+from .image import Image
+
+# numba 是選配：有裝就把 8x8 IDCT 編成原生碼，沒裝就走 BLAS matmul
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+def _build_idct_basis(n=8):
+    """
+    預先建好 IDCT 的餘弦基底矩陣 M，
+    M[x, u] = c(u) * cos((2x+1) * u * pi / (2N)) * sqrt(2/N)，
+    其中 c(0) = 1/sqrt(2)、c(u>0) = 1。
+    之後 1-D IDCT 就是一個矩陣乘法 f = M @ F。
+    """
+    M = np.zeros([n, n], dtype=np.float64)
+    for x in range(n):
+        for u in range(n):
+            c = 1 / math.sqrt(2) if u == 0 else 1.0
+            M[x, u] = math.sqrt(2 / n) * c * math.cos((2 * x + 1) * u * math.pi / (2 * n))
+    # 8-bit 輸出用 float32 精度綽綽有餘，記憶體頻寬直接砍半
+    return M.astype(np.float32)
+
+# 模組載入時算一次，所有 block 共用
+IDCT_M = _build_idct_basis()
+
+# AAN (Arai-Agui-Nakajima) scaled IDCT 的縮放向量：
+# s[0] = 1、s[k>0] = cos(k*pi/16) * sqrt(2)。
+# 把 outer(s, s) / 8 預先乘進反量化表之後，
+# 每個 1-D pass 只剩 ~5 個乘法 + ~29 個加法 (libjpeg jidctflt 的作法)。
+_AAN_SCALE_1D = np.array(
+    [1.0] + [math.cos(k * math.pi / 16) * math.sqrt(2) for k in range(1, 8)],
+    dtype=np.float64,
+)
+AAN_SCALE_2D = (np.outer(_AAN_SCALE_1D, _AAN_SCALE_1D) / 8.0).astype(np.float32)
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _idct_aan_8x8(block):
+        """
+        AAN 8 點快速 IDCT (移植自 libjpeg 的 jidctflt.c)。
+        輸入必須已經乘過 AAN_SCALE_2D (縮放折進反量化表)。
+        先對每個 column 做 1-D pass，再對每個 row 做一次。
+        """
+        tmp = np.empty((8, 8), dtype=np.float32)
+        # column pass
+        for c in range(8):
+            # even part
+            t0 = block[0, c]
+            t1 = block[2, c]
+            t2 = block[4, c]
+            t3 = block[6, c]
+            t10 = t0 + t2
+            t11 = t0 - t2
+            t13 = t1 + t3
+            t12 = (t1 - t3) * 1.414213562 - t13
+            t0 = t10 + t13
+            t3 = t10 - t13
+            t1 = t11 + t12
+            t2 = t11 - t12
+            # odd part
+            t4 = block[1, c]
+            t5 = block[3, c]
+            t6 = block[5, c]
+            t7 = block[7, c]
+            z13 = t6 + t5
+            z10 = t6 - t5
+            z11 = t4 + t7
+            z12 = t4 - t7
+            t7 = z11 + z13
+            t11 = (z11 - z13) * 1.414213562
+            z5 = (z10 + z12) * 1.847759065
+            t10 = 1.082392200 * z12 - z5
+            t12 = -2.613125930 * z10 + z5
+            t6 = t12 - t7
+            t5 = t11 - t6
+            t4 = t10 + t5
+            tmp[0, c] = t0 + t7
+            tmp[7, c] = t0 - t7
+            tmp[1, c] = t1 + t6
+            tmp[6, c] = t1 - t6
+            tmp[2, c] = t2 + t5
+            tmp[5, c] = t2 - t5
+            tmp[4, c] = t3 + t4
+            tmp[3, c] = t3 - t4
+        out = np.empty((8, 8), dtype=np.float32)
+        # row pass
+        for r in range(8):
+            t0 = tmp[r, 0]
+            t1 = tmp[r, 2]
+            t2 = tmp[r, 4]
+            t3 = tmp[r, 6]
+            t10 = t0 + t2
+            t11 = t0 - t2
+            t13 = t1 + t3
+            t12 = (t1 - t3) * 1.414213562 - t13
+            t0 = t10 + t13
+            t3 = t10 - t13
+            t1 = t11 + t12
+            t2 = t11 - t12
+            t4 = tmp[r, 1]
+            t5 = tmp[r, 3]
+            t6 = tmp[r, 5]
+            t7 = tmp[r, 7]
+            z13 = t6 + t5
+            z10 = t6 - t5
+            z11 = t4 + t7
+            z12 = t4 - t7
+            t7 = z11 + z13
+            t11 = (z11 - z13) * 1.414213562
+            z5 = (z10 + z12) * 1.847759065
+            t10 = 1.082392200 * z12 - z5
+            t12 = -2.613125930 * z10 + z5
+            t6 = t12 - t7
+            t5 = t11 - t6
+            t4 = t10 + t5
+            out[r, 0] = t0 + t7
+            out[r, 7] = t0 - t7
+            out[r, 1] = t1 + t6
+            out[r, 6] = t1 - t6
+            out[r, 2] = t2 + t5
+            out[r, 5] = t2 - t5
+            out[r, 4] = t3 + t4
+            out[r, 3] = t3 - t4
+        return out
+else:
+    _idct_aan_8x8 = None
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _idct_8x8(block, M):
+        """
+        M @ block @ M.T 的顯式迴圈版本。
+        8x8 太小，BLAS 的呼叫開銷吃掉不少時間；
+        交給 LLVM 展開 + 向量化反而更快。
+        """
+        G = np.zeros((8, 8), dtype=np.float32)
+        for i in range(8):
+            for j in range(8):
+                s = 0.0
+                for k in range(8):
+                    s += M[i, k] * block[k, j]
+                G[i, j] = s
+        out = np.zeros((8, 8), dtype=np.float32)
+        for i in range(8):
+            for j in range(8):
+                s = 0.0
+                for k in range(8):
+                    s += G[i, k] * M[j, k]
+                out[i, j] = s
+        return out
+else:
+    _idct_8x8 = None
 
 class IDCT_1D():
     """
@@ -18,50 +170,26 @@ class IDCT_1D():
     def solve(self):
         """
         METHOD: Compute inverse DCT of x
+        用預先算好的基底矩陣做一次矩陣乘法，
+        取代原本 O(N^2) 的 Python 雙迴圈 (每個 cos 都現算)。
         """
-        f = np.zeros(self.N, dtype=np.float64)
-        for x in range(self.N):
-                sumuv =0
-                for u in range(self.N):
-                    if u==0:
-                       sumuv += (1/(math.sqrt(2)))* self.F[u]*math.cos((2*x+1)*u*math.pi/(2*self.N))
-                    else:
-                       sumuv +=  self.F[u]*math.cos((2*x+1)*u*math.pi/(2*self.N))
-                # 最終結果
-                f[x]= math.sqrt(2/self.N) *sumuv   
-        return f
+        return IDCT_M @ self.F
 class IDCT_2D_RowColumn():
     """
     使用行-列法 (Row-Column Method) 實作 2-D IDCT。
     """
     def __init__(self, x):
-        self.F = x # 輸入是 DCT 係數矩陣
+        # 輸入是 DCT 係數矩陣，進來時先轉成 ndarray (只轉這一次)
+        self.F = np.asarray(x, dtype=np.float32)
         self.N = np.shape(x)[0]
 
     def solve(self):
-        N = self.N
-        
-        # 步驟一: 對每一行進行 1D IDCT
-        # G 是儲存中間結果的矩陣
-        G = np.zeros([N, N], dtype=np.float64)
-        
-        for row_idx in range(N):
-            input_row = self.F[row_idx, :]
-            idct_solver_1d = IDCT_1D(input_row)
-            row_reconstruction = idct_solver_1d.solve()
-            G[row_idx, :] = row_reconstruction
-            
-        
-        # 步驟二: 對中間矩陣 G 的每一列進行 1D IDCT
-        f = np.zeros([N, N], dtype=np.float64)
-        
-        for col_idx in range(N):
-            input_column = G[:, col_idx]
-            idct_solver_1d = IDCT_1D(input_column)
-            column_reconstruction = idct_solver_1d.solve()
-            f[:, col_idx] = column_reconstruction
-            
-        return f
+        # 行-列法其實就是 M @ F @ M^T：
+        # M @ F 對每一行做 1D IDCT，再右乘 M^T 對每一列做 1D IDCT。
+        # 有 numba 時用 JIT 過的顯式迴圈版本，否則交給 BLAS。
+        if _idct_8x8 is not None and self.N == 8:
+            return _idct_8x8(self.F, IDCT_M)
+        return IDCT_M @ self.F @ IDCT_M.T
 ZZ = [
     [ 0,  1,  5,  6, 14, 15, 27, 28],
     [ 2,  4,  7, 13, 16, 26, 29, 42],
@@ -73,9 +201,69 @@ ZZ = [
     [35, 36, 48, 49, 57, 58, 62, 63]
 ]
 
+# ZZ 攤平成一維 permutation：
+# 空間位置 (r, c) 的係數在 zigzag 序列中是第 ZZ_INV_INDEX[r*8+c] 個，
+# 所以 de-zigzag 就是一次 fancy-index gather：raw.ravel()[ZZ_INV_INDEX]
+ZZ_INV_INDEX = np.array([ZZ[r][c] for r in range(8) for c in range(8)])
+
+# YCbCr -> RGB 的轉換矩陣 (JFIF 標準係數)，
+# 疊成一個 (3,3) 常數矩陣後整張圖一次 GEMM 就轉完
+M_COLOR = np.array(
+    [
+        [1.0, 0.0, 1.402],
+        [1.0, -0.34414, -0.71414],
+        [1.0, 1.772, 0.0],
+    ],
+    dtype=np.float32,
+)
+
+def ycbcr_to_rgb(Y, Cb, Cr):
+    """
+    把三個同解析度的 YCbCr 平面轉成 (H, W, 3) uint8 RGB。
+    三組 per-plane 運算式改成一個 (H*W, 3) @ M_COLOR.T 的矩陣乘法，
+    最後加 128 level shift、clip、轉 uint8。
+    """
+    h, w = Y.shape
+    ycc = np.stack([Y, Cb, Cr], axis=-1).reshape(-1, 3)
+    rgb = ycc @ M_COLOR.T + np.float32(128.0)
+    return np.clip(np.round(rgb), 0, 255).astype(np.uint8).reshape(h, w, 3)
+
+def upsample_plane(plane, up_v, up_h):
+    """
+    Chroma 上採樣：把採樣率較低的分量平面放大到 MCU / 影像解析度。
+    np.repeat 正好就是 4:2:0 / 4:2:2 的 nearest-neighbor 上採樣，
+    取代逐 pixel 的 `int(i * sampling / max_sampling)` 索引計算。
+    """
+    if up_v > 1:
+        plane = np.repeat(plane, up_v, axis=0)
+    if up_h > 1:
+        plane = np.repeat(plane, up_h, axis=1)
+    return plane
+
 class MCUWrap():
     def __init__(self, MCU,jpeg_meta_data):
-        self.mcu = MCU
+        # MCU 是 (blocks, 64) 的連續 int16 陣列 (自然順序)，
+        # 這裡先用 ZZ_INV_INDEX 轉回 zigzag 順序，再切成
+        # [component][v][h] -> 8x8 的巢狀結構，
+        # 各個 stage 方法 (display / dequantize / ...) 照舊運作
+        components = jpeg_meta_data.sof_info.components
+        mcu = []
+        b = 0
+        for i in range(3):
+            comp_data = []
+            for v in range(components[i].vertical_sampling):
+                row_blocks = []
+                for h in range(components[i].horizontal_sampling):
+                    natural = np.asarray(MCU[b], dtype=np.float32)
+                    # natural[pos] 在 zigzag 序列裡是第 ZZ_INV_INDEX[pos] 個，
+                    # scatter 回去就還原成 read_mcu 原本的 zigzag 排列
+                    zig = np.empty(64, dtype=np.float32)
+                    zig[ZZ_INV_INDEX] = natural
+                    row_blocks.append(zig.reshape(8, 8))
+                    b += 1
+                comp_data.append(row_blocks)
+            mcu.append(comp_data)
+        self.mcu = mcu
         self.jpeg_meta_data = jpeg_meta_data
     def display(self): 
         sof_info = self.jpeg_meta_data.sof_info
@@ -109,21 +297,11 @@ class MCUWrap():
                     
                     # 取得目前尚未排列正確的 block (Raw Block)
                     # 在 read_mcu 中，資料是依照 zigzag 順序直接填入 array 的
-                    raw_block = self.mcu[i][v][h]
-                    
-                    # 建立一個新的暫存 block 用來存放正確空間順序的係數
-                    tmp = [[0.0] * 8 for _ in range(8)]
-                    
-                    # 使用查表法重新排列
-                    for r in range(8):
-                        for c in range(8):
-                            # 邏輯：查表得知 (r,c) 這個位置在 ZigZag 序列是第幾個 (z_index)
-                            # 然後去 raw_block 中把那個順序的值抓出來
-                            z_index = ZZ[r][c]
-                            tmp[r][c] = raw_block[z_index // 8][z_index % 8]
-                    
-                    # 將排列好的 block 放回 MCU
-                    self.mcu[i][v][h] = tmp
+                    raw_flat = np.asarray(self.mcu[i][v][h]).ravel()
+
+                    # 用預先算好的 permutation 一次 gather 回空間順序，
+                    # 取代 64 次 Python 層級的查表 + 指派
+                    self.mcu[i][v][h] = raw_flat[ZZ_INV_INDEX].reshape(8, 8)
                     
     def dequantize(self):
         """
@@ -131,21 +309,46 @@ class MCUWrap():
         對 MCU 內的每個 Block 進行反量化。
         """
         sof = self.jpeg_meta_data.sof_info
-        
+
         # 遍歷 Component
         for i in range(len(self.mcu)):
-            # 取得該 Component 的 Quantization Table
+            # 取得該 Component 的 Quantization Table (整理成 8x8 ndarray)
             # comp_id = sof.components[i]
             q_table_id = sof.components[i].quantization_table_id
-            quant_table = self.jpeg_meta_data.quantization_tables[q_table_id]
-                    
+            quant_table = np.asarray(
+                self.jpeg_meta_data.quantization_tables[q_table_id], dtype=np.float32
+            ).reshape(8, 8)
+
             for v in range(len(self.mcu[i])):
                 for h in range(len(self.mcu[i][v])):
-                    # In-place 修改
-                    for r in range(8):
-                        for c in range(8):
-                            self.mcu[i][v][h][r][c] *= quant_table[r * 8 + c]
+                    # 64 個純量乘法改成一次 elementwise 乘法
+                    self.mcu[i][v][h] = np.asarray(self.mcu[i][v][h]) * quant_table
         # return mcu
+    def dequantize_and_dezigzag(self):
+        """
+        反量化 + 反向 Zig-Zag 融合成單一 pass。
+        兩個步驟各自都要掃過每個 block 的 64 個係數，
+        融合後每個 block 只做一次 gather + 一次乘法。
+        """
+        sof = self.jpeg_meta_data.sof_info
+
+        for i in range(len(self.mcu)):
+            q_table_id = sof.components[i].quantization_table_id
+            quant_flat = np.asarray(
+                self.jpeg_meta_data.quantization_tables[q_table_id], dtype=np.float32
+            )
+            # 量化表本身也是 zigzag 順序存放，先用同一個 permutation
+            # 排成空間順序，乘法就能直接對齊 gather 之後的 block
+            quant_2d = quant_flat[ZZ_INV_INDEX].reshape(8, 8)
+            if _idct_aan_8x8 is not None:
+                # AAN 的縮放直接折進反量化表，IDCT 本體就不用再乘
+                quant_2d = quant_2d * AAN_SCALE_2D
+
+            for v in range(len(self.mcu[i])):
+                for h in range(len(self.mcu[i][v])):
+                    raw_flat = np.asarray(self.mcu[i][v][h]).ravel()
+                    self.mcu[i][v][h] = raw_flat[ZZ_INV_INDEX].reshape(8, 8) * quant_2d
+
     def idct(self):
         """
         對應 Rust: MCUWrap::idct
@@ -154,20 +357,23 @@ class MCUWrap():
         for i in range(len(self.mcu)):
             for v in range(len(self.mcu[i])):
                 for h in range(len(self.mcu[i][v])):
-                    # 取出 Block (這是 List[List]) 轉成 Numpy 以利運算
-                    block_data = np.array(self.mcu[i][v][h])
-                    
-                    # 呼叫你原本寫好的 2D IDCT Solver
-                    solver = IDCT_2D_RowColumn(block_data)
+                    # 呼叫 2D IDCT Solver (建構子內會處理 ndarray 轉換)
+                    solver = IDCT_2D_RowColumn(self.mcu[i][v][h])
                     pixels = solver.solve()
-                    
+
                     # 存回 MCU (轉回 List 或是保持 Numpy 都可以，看 mcu_to_rgb 怎麼接)
                     self.mcu[i][v][h] = pixels
         
     def decode(self):
-        self.dequantize()
-        self.inverse_zigzag_scan()
-        self.idct()
+        self.dequantize_and_dezigzag()
+        if _idct_aan_8x8 is not None:
+            # dequantize_and_dezigzag 已經做過 AAN 縮放，走快速 IDCT
+            for i in range(len(self.mcu)):
+                for v in range(len(self.mcu[i])):
+                    for h in range(len(self.mcu[i][v])):
+                        self.mcu[i][v][h] = _idct_aan_8x8(self.mcu[i][v][h])
+        else:
+            self.idct()
     def show_all_stage(self): 
         print("---------------- 未經處理 ----------------")
         self.display()
@@ -187,36 +393,24 @@ class MCUWrap():
 
         sof_info = self.jpeg_meta_data.sof_info
         component_infos = sof_info.components
-        max_vertical_sampling = sof_info.max_vertical_sampling 
-        max_horizontal_sampling = sof_info.max_horizontal_sampling 
-        mcu_height = 8 * max_vertical_sampling 
-        mcu_width = 8 * max_horizontal_sampling 
-
-        ret = [[Color.RGB(0, 0, 0) for _ in range(int(mcu_width))] for _ in range(int(mcu_height))]
-        for i in range(mcu_height): 
-            for j in range(mcu_width): 
-                # // 獲取 Y, Cb, Cr 三個顏色分量所對應的採樣
-                YCbCr = [0.0, 0.0, 0.0]
-                for id in range(3) :
-                    vh = int(i * component_infos[id].vertical_sampling / max_vertical_sampling)
-                    vw = int(j * component_infos[id].horizontal_sampling / max_horizontal_sampling)
-                    YCbCr[id] = self.mcu[id][vh //8][vw // 8][vh % 8][vw % 8] 
-                
-                Y, Cb, Cr = YCbCr[0], YCbCr[1], YCbCr[2]
-                # // let (Y, Cb, Cr) = (YCbCr[0], 0.0, 0.0) 
-                R = chomp(Y + 1.402*Cr + 128.0) 
-                G = chomp(Y - 0.34414*Cb - 0.71414*Cr + 128.0) 
-                B = chomp(Y + 1.772*Cb + 128.0) 
-                ret[i ][j] = Color.RGB(R, G, B) 
-            
-        
-        return ret 
+        max_vertical_sampling = sof_info.max_vertical_sampling
+        max_horizontal_sampling = sof_info.max_horizontal_sampling
 
+        # 把每個 component 的 8x8 blocks 拼成整張 MCU 的平面，
+        # 再用 np.repeat 做 chroma 上採樣對齊到 MCU 解析度
+        planes = []
+        for id in range(3):
+            c_info = component_infos[id]
+            plane = np.block(self.mcu[id])
+            up_v = max_vertical_sampling // c_info.vertical_sampling
+            up_h = max_horizontal_sampling // c_info.horizontal_sampling
+            planes.append(upsample_plane(plane, up_v, up_h))
 
-def chomp(val):
-    """ 將數值限制在 [0, 255] 並轉為整數 """
-    return int(max(0, min(255, round(val))))
-
+        # // 獲取 Y, Cb, Cr 三個顏色分量所對應的採樣
+        # // let (Y, Cb, Cr) = (YCbCr[0], 0.0, 0.0)
+        # 整個 MCU 一次轉換，回傳 (mcu_h, mcu_w, 3)
+        Y, Cb, Cr = planes
+        return ycbcr_to_rgb(Y, Cb, Cr)
 
 
 def decoder(filepath):
@@ -225,26 +419,69 @@ def decoder(filepath):
         f.close()
 
         sof_info = jpeg_meta_data.sof_info
-        mcu_width = 8 * sof_info.max_horizontal_sampling 
-        mcu_height = 8 * sof_info.max_vertical_sampling 
+        mcu_width = 8 * sof_info.max_horizontal_sampling
+        mcu_height = 8 * sof_info.max_vertical_sampling
 
         # // 寬度上有幾個 MCU
-        mcu_width_number = int((sof_info.width- 1) / mcu_width + 1) 
+        mcu_width_number = int((sof_info.width- 1) / mcu_width + 1)
         # // 高度上有幾個 MCU
-        mcu_height_number = int((sof_info.height - 1) / mcu_height + 1) 
+        mcu_height_number = int((sof_info.height - 1) / mcu_height + 1)
 
         image_width = int(mcu_width_number * mcu_width)
-        image_height = int(mcu_height_number * mcu_height) 
+        image_height = int(mcu_height_number * mcu_height)
         img = Image.new(image_width, image_height)
 
-        for h in range(mcu_height_number) :
-            for w in range(mcu_width_number) :
-                mcu = MCUs[h][w].copy()
-                mcu_rgb = MCUWrap(mcu, jpeg_meta_data).toRGB()
-                for y in range(mcu_height) :
-                    for x in range(mcu_width) :
-                        img.pixels[h*mcu_height + y][w*mcu_width + x] = mcu_rgb[y][x]
-                   
+        # 迴圈外先把所有不變量從 metadata 的屬性鏈拉成 locals：
+        # 採樣因子、每個 component 對應的 (已排成空間順序的) 量化表
+        components = sof_info.components
+        max_v = sof_info.max_vertical_sampling
+        max_h = sof_info.max_horizontal_sampling
+        quantization_tables = jpeg_meta_data.quantization_tables
+        v_samps = [c.vertical_sampling for c in components]
+        h_samps = [c.horizontal_sampling for c in components]
+        q_spatial_for_comp = [
+            np.asarray(
+                quantization_tables[c.quantization_table_id], dtype=np.float32
+            )[ZZ_INV_INDEX]
+            for c in components
+        ]
+
+        # 不再逐 MCU 處理：MCUs 本身就是 (h_mcus, w_mcus, blocks, 64) 的
+        # 連續係數陣列，每個 component 切出自己的 blocks 之後，
+        # 反量化 / de-zigzag / IDCT 全部批次做完
+        planes = []
+        block_offset = 0
+        for i in range(3):
+            v_s = v_samps[i]
+            h_s = h_samps[i]
+
+            # (mcu_h_n, mcu_w_n, v_s*h_s, 64)，block 內已是自然順序
+            # (讀檔時就照 ZIGZAG 表寫好了，這裡不再需要 gather)
+            n_blocks = mcu_height_number * mcu_width_number * v_s * h_s
+            flat = (
+                MCUs[:, :, block_offset:block_offset + v_s * h_s, :]
+                .reshape(n_blocks, 64)
+                .astype(np.float32)
+            )
+            block_offset += v_s * h_s
+
+            # 反量化：量化表已排成自然順序，直接 elementwise 乘
+            deq = flat * q_spatial_for_comp[i]
+            deq = deq.reshape(n_blocks, 8, 8)
+
+            # 整個 component 一次 batched IDCT：M @ B[n] @ M.T
+            spatial = np.einsum('ij,njk,lk->nil', IDCT_M, deq, IDCT_M)
+
+            # blocks 拼回 component 平面，再上採樣到 MCU 解析度
+            plane = spatial.reshape(mcu_height_number, mcu_width_number, v_s, h_s, 8, 8)
+            plane = plane.transpose(0, 2, 4, 1, 3, 5).reshape(
+                mcu_height_number * v_s * 8, mcu_width_number * h_s * 8
+            )
+            planes.append(upsample_plane(plane, max_v // v_s, max_h // h_s))
+
+        Y, Cb, Cr = planes
+        img.pixels[:, :] = ycbcr_to_rgb(Y, Cb, Cr)
+
         return img
 
 
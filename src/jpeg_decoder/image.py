@@ -1,6 +1,8 @@
 from dataclasses import dataclass, field
 from typing import List
 
+import numpy as np
+
 @dataclass
 class Color:
     r: int = 0
@@ -10,14 +12,16 @@ class Color:
     @staticmethod
     def RGB(r: int, g: int, b: int) -> "Color":
         return Color(r, g, b)
-    
+
 @dataclass
 class Image:
     width: int
     height: int
-    pixels: List[List[Color]] = field(default_factory=list)
+    # (height, width, 3) uint8，一整塊連續記憶體，
+    # 取代原本 H*W 個 Color 物件的巢狀 list
+    pixels: np.ndarray = None
 
     @staticmethod
     def new(width: int, height: int) -> "Image":
-        pixels = [[Color.RGB(0, 0, 0) for _ in range(width)] for _ in range(height)]
-        return Image(width, height, pixels)
\ No newline at end of file
+        pixels = np.zeros((height, width, 3), dtype=np.uint8)
+        return Image(width, height, pixels)
@@ -12,10 +12,88 @@
 # 無data的segment只有2bytes
 # 有data的segment在marker後緊接著2bytes為此segment的長度(因此要扣除2bytes才是後面的資料量)
 from __future__ import annotations
+import io
+import mmap
+import struct
 from pathlib import Path
 from typing import BinaryIO, Union
 
-from .primitives import JPEGMetadata, AppInfo, SofInfo, ComponentInfo
+import numpy as np
+
+from .primitives import JPEGMetadata, AppInfo, SofInfo, ComponentInfo, HUFF_LOOKAHEAD
+
+
+def build_fast_huffman_table(huffman_dict):
+    """
+    把 (bit_length, code) -> symbol 的 dict 整理成 512-entry 直接索引表。
+    peek 連續 HUFF_LOOKAHEAD 個 bit 當索引，命中就同時拿到
+    symbol 和 code 長度 (hi byte = 長度, lo byte = symbol)；
+    超過 HUFF_LOOKAHEAD bit 的 code 維持 0xFFFF，交給慢速路徑。
+    """
+    fast_table = np.full(1 << HUFF_LOOKAHEAD, 0xFFFF, dtype=np.uint16)
+    for (bit_length, code), symbol in huffman_dict.items():
+        if bit_length > HUFF_LOOKAHEAD:
+            continue
+        shift = HUFF_LOOKAHEAD - bit_length
+        fast_table[code << shift:(code + 1) << shift] = (bit_length << 8) | symbol
+    return fast_table
+
+def build_canonical_huffman(huffman_dict):
+    """
+    把 (bit_length, code) -> symbol 的 dict 整理成 JPEG Annex F 的
+    canonical 解碼陣列 (MINCODE / MAXCODE / VALPTR + HUFFVAL)。
+    解碼時逐 bit 累積 code，只要 code <= max_code[l] 就能用
+    val_ptr[l] + code - min_code[l] 直接索引到 symbol，
+    整組表都是小的 int32 陣列，可以原封不動丟進 numba kernel。
+    沒有任何 code 的長度其 max_code 為 -1。
+    """
+    min_code = np.zeros(17, dtype=np.int32)
+    max_code = np.full(17, -1, dtype=np.int32)
+    val_ptr = np.zeros(17, dtype=np.int32)
+    huffval = np.zeros(256, dtype=np.int32)
+
+    idx = 0
+    for bit_length in range(1, 17):
+        codes = sorted(
+            (code, symbol)
+            for (length, code), symbol in huffman_dict.items()
+            if length == bit_length
+        )
+        if not codes:
+            continue
+        min_code[bit_length] = codes[0][0]
+        max_code[bit_length] = codes[-1][0]
+        val_ptr[bit_length] = idx
+        for _, symbol in codes:
+            huffval[idx] = symbol
+            idx += 1
+    return min_code, max_code, val_ptr, huffval
+
+def build_fast_ac_table(huffman_dict):
+    """
+    libjpeg-turbo 風格的 fast-AC 表：對每個 HUFF_LOOKAHEAD-bit peek，
+    如果對應的 AC symbol 連同它的 magnitude bits 都塞得進 lookahead，
+    就預先把 (run 長度, 總共消耗的 bit 數, 解好的帶號數值) 算出來，
+    解碼時 Huffman 查表 + read_value 兩個階段合併成一次索引。
+    塞不下 (或 EOB/ZRL 這種 size=0 的 symbol) 的 entry 為 None。
+    """
+    fast_ac = [None] * (1 << HUFF_LOOKAHEAD)
+    for peek in range(1 << HUFF_LOOKAHEAD):
+        for (bit_length, code), symbol in huffman_dict.items():
+            if bit_length > HUFF_LOOKAHEAD:
+                continue
+            if (peek >> (HUFF_LOOKAHEAD - bit_length)) != code:
+                continue
+            run = symbol >> 4
+            size = symbol & 0x0F
+            if size == 0 or bit_length + size > HUFF_LOOKAHEAD:
+                break  # EOB / ZRL 或 magnitude 超出 lookahead，走慢速路徑
+            # magnitude bits 就接在 code 後面，直接從 peek 取出來解碼
+            m = (peek >> (HUFF_LOOKAHEAD - bit_length - size)) & ((1 << size) - 1)
+            value = m if m >= (1 << (size - 1)) else m - ((1 << size) - 1)
+            fast_ac[peek] = (run, bit_length + size, value)
+            break
+    return fast_ac
 
 def marker_info(marker: int) -> str:
     
@@ -44,122 +122,162 @@ def read_u16(f) -> int:
     return (bytes_read[0] << 8) | bytes_read[1]
 
 
+def read_u16_from(data: bytes, pos: int):
+    """data[pos:pos+2] 的 big-endian u16 與新的 pos。
+    buffer 版本：沒有 f.read 呼叫開銷。"""
+    if pos + 2 > len(data):
+        raise IOError("Unexpected length while reading 2 bytes")
+    return struct.unpack_from(">H", data, pos)[0], pos + 2
+
+
+def _read_segment(f: BinaryIO, length: int, what: str) -> bytes:
+    """把整個區段 (length - 2 bytes) 一次讀成 buffer，之後全用索引解析。"""
+    data = f.read(length - 2)
+    if len(data) != length - 2:
+        raise IOError(f"Unexpected length while reading {what}")
+    return data
+
+
 def parse_app0(f: BinaryIO, length: int, metadata: JPEGMetadata) -> None:
     """Parse APP0 (JFIF) segment and store in metadata.app_info."""
-    # length includes the 2 bytes for length field itself, so data is length - 2
+    # 整段一次進 buffer，固定 offset 直接索引 / unpack
+    data = _read_segment(f, length, "APP0 segment")
+    app = metadata.app_info
     # Identifier: 5 bytes (e.g., "JFIF\0")
-    metadata.app_info.identifier = f.read(5)
+    app.identifier = data[0:5]
     # Version: 2 bytes (major, minor)
-    metadata.app_info.version_major_id = read_u8(f)
-    metadata.app_info.version_minor_id = read_u8(f)
+    app.version_major_id = data[5]
+    app.version_minor_id = data[6]
     # Units: 1 byte (0=no units, 1=dots per inch, 2=dots per cm)
-    metadata.app_info.units = read_u8(f)
-    # X density: 2 bytes
-    metadata.app_info.x_density = read_u16(f)
-    # Y density: 2 bytes
-    metadata.app_info.y_density = read_u16(f)
-    # X thumbnail: 1 byte
-    metadata.app_info.x_thumbnail = read_u8(f)
-    # Y thumbnail: 1 byte
-    metadata.app_info.y_thumbnail = read_u8(f)
-    # Skip thumbnail data if any (length - 2 - 14 = remaining bytes)
-    thumbnail_size = metadata.app_info.x_thumbnail * metadata.app_info.y_thumbnail * 3
-    if thumbnail_size > 0:
-        f.read(thumbnail_size)
+    app.units = data[7]
+    # X / Y density: 2 bytes each (big-endian)
+    app.x_density, app.y_density = struct.unpack_from(">HH", data, 8)
+    # X / Y thumbnail: 1 byte each
+    app.x_thumbnail = data[12]
+    app.y_thumbnail = data[13]
+    # Thumbnail data (若有) 已經包含在同一個 slice 裡，不需要再 skip
 
 
 def parse_dqt(f: BinaryIO, length: int, metadata: JPEGMetadata) -> None:
     """Parse DQT (Define Quantization Table) segment."""
-    # length includes the 2 bytes for length field, so data is length - 2
-    bytes_remaining = length - 2
-    
-    while bytes_remaining > 0:
+    # 整段一次進 buffer，之後純索引解析
+    data = _read_segment(f, length, "quantization table")
+    pos = 0
+    end = len(data)
+
+    while pos < end:
         # Table info: 1 byte (upper 4 bits = precision, lower 4 bits = table ID)
-        table_info = read_u8(f)
-        bytes_remaining -= 1
-        
+        table_info = data[pos]
+        pos += 1
+
         precision = (table_info >> 4) & 0x0F  # 0 = 8-bit, 1 = 16-bit
         table_id = table_info & 0x0F
-        
-        # Read 64 quantization values
+
+        # Read 64 quantization values (frombuffer 直接吃 segment buffer，
+        # 向量化轉型取代 64 次 read_u8/read_u16 + float() 呼叫)
         if precision == 0:
             # 8-bit precision: 64 bytes
-            for i in range(64):
-                metadata.quantization_tables[table_id][i] = float(read_u8(f))
-            bytes_remaining -= 64
+            if pos + 64 > end:
+                raise IOError("Unexpected length while reading quantization table")
+            metadata.quantization_tables[table_id] = np.frombuffer(
+                data, dtype=np.uint8, count=64, offset=pos
+            )
+            pos += 64
         else:
-            # 16-bit precision: 128 bytes
-            for i in range(64):
-                metadata.quantization_tables[table_id][i] = float(read_u16(f))
-            bytes_remaining -= 128
+            # 16-bit precision: 128 bytes (big-endian)
+            if pos + 128 > end:
+                raise IOError("Unexpected length while reading quantization table")
+            metadata.quantization_tables[table_id] = np.frombuffer(
+                data, dtype=">u2", count=64, offset=pos
+            )
+            pos += 128
 
 
 def parse_dht(f: BinaryIO, length: int, metadata: JPEGMetadata) -> None:
     """Parse DHT (Define Huffman Table) segment."""
-    # length includes the 2 bytes for length field, so data is length - 2
-    bytes_remaining = length - 2
-    
-    while bytes_remaining > 0:
+    # 整段一次進 buffer，之後純索引解析
+    data = _read_segment(f, length, "huffman table")
+    pos = 0
+    end = len(data)
+
+    while pos < end:
         # Table info: 1 byte (bit 4 = AC/DC, bits 0-3 = table ID)
-        table_info = read_u8(f)
-        bytes_remaining -= 1
-        
+        table_info = data[pos]
+        pos += 1
+
         table_class = (table_info >> 4) & 0x0F  # 0 = DC, 1 = AC
         table_id = table_info & 0x0F
-        
-        # Read 16 bytes: number of codes for each bit length (1-16)
-        code_counts = []
-        for _ in range(16):
-            code_counts.append(read_u8(f))
-        bytes_remaining -= 16
-        
+
+        # 16 bytes: number of codes for each bit length (1-16)
+        if pos + 16 > end:
+            raise IOError("Unexpected length while reading huffman code counts")
+        code_counts = data[pos:pos + 16]
+        pos += 16
+
+        # All symbols as one slice (一張 AC 表最多 162 個 symbol，
+        # 逐一 read_u8 會多出上百次 Python call)
+        total_codes = sum(code_counts)
+        symbols = data[pos:pos + total_codes]
+        if len(symbols) != total_codes:
+            raise IOError("Unexpected length while reading huffman symbols")
+        pos += total_codes
+
         # Build Huffman table: (bit_length, code) -> symbol
-        # Read symbols and assign codes
+        # Assign codes by walking the symbol bytes (bytes 索引是 C-speed)
         code = 0
+        sym_idx = 0
         huffman_dict = {}
-        
+
         for bit_length in range(16):
             num_codes = code_counts[bit_length]
             for _ in range(num_codes):
-                symbol = read_u8(f)
-                bytes_remaining -= 1
+                symbol = symbols[sym_idx]
+                sym_idx += 1
                 # Store mapping: (bit_length + 1, code) -> symbol
                 huffman_dict[(bit_length + 1, code)] = symbol
                 code += 1
             # Shift code left for next bit length
             code <<= 1
         
-        # Store in appropriate table
+        # Store in appropriate table (dict + 直接索引的 fast table)
+        fast_table = build_fast_huffman_table(huffman_dict)
+        canonical = build_canonical_huffman(huffman_dict)
         if table_class == 0:
             metadata.huffman_tables.dc_tables[table_id] = huffman_dict
+            metadata.huffman_tables.dc_fast[table_id] = fast_table
+            metadata.huffman_tables.dc_canon[table_id] = canonical
         else:
             metadata.huffman_tables.ac_tables[table_id] = huffman_dict
+            metadata.huffman_tables.ac_fast[table_id] = fast_table
+            metadata.huffman_tables.ac_canon[table_id] = canonical
+            metadata.huffman_tables.fast_ac[table_id] = build_fast_ac_table(huffman_dict)
 
 
 def parse_sof0(f: BinaryIO, length: int, metadata: JPEGMetadata) -> None:
     """Parse SOF0 (Start of Frame - Baseline DCT) segment."""
-    # Precision: 1 byte (bits per sample, usually 8)
-    metadata.sof_info.precision = read_u8(f)
-    # Height: 2 bytes
-    metadata.sof_info.height = read_u16(f)
-    # Width: 2 bytes
-    metadata.sof_info.width = read_u16(f)
-    # Number of components: 1 byte (usually 3 for YCbCr)
-    num_components = read_u8(f)
-    
+    # 整段一次進 buffer，固定欄位直接 unpack
+    data = _read_segment(f, length, "SOF0 segment")
+    # Precision: 1 byte / Height, Width: 2 bytes each / components: 1 byte
+    (
+        metadata.sof_info.precision,
+        metadata.sof_info.height,
+        metadata.sof_info.width,
+        num_components,
+    ) = struct.unpack_from(">BHHB", data, 0)
+
     max_h_sampling = 0
     max_v_sampling = 0
-    
+
     # For each component: 3 bytes
+    pos = 6
     for i in range(num_components):
         # Component ID: 1 byte (usually 1=Y, 2=Cb, 3=Cr)
-        component_id = read_u8(f)
         # Sampling factors: 1 byte (upper 4 bits = horizontal, lower 4 bits = vertical)
-        sampling = read_u8(f)
+        # Quantization table ID: 1 byte
+        component_id, sampling, quant_table_id = struct.unpack_from(">BBB", data, pos)
+        pos += 3
         h_sampling = (sampling >> 4) & 0x0F
         v_sampling = sampling & 0x0F
-        # Quantization table ID: 1 byte
-        quant_table_id = read_u8(f)
         
         # Store component info (component_id is 1-indexed, array is 0-indexed)
         idx = component_id - 1
@@ -176,30 +294,37 @@ def parse_sof0(f: BinaryIO, length: int, metadata: JPEGMetadata) -> None:
     metadata.sof_info.max_vertical_sampling = max_v_sampling
 
 
+def parse_dri(f: BinaryIO, length: int, metadata: JPEGMetadata) -> None:
+    """Parse DRI (Define Restart Interval) segment."""
+    # Restart interval: 2 bytes (MCUs between RST markers, 0 = disabled)
+    data = _read_segment(f, length, "restart interval")
+    metadata.restart_interval, _ = read_u16_from(data, 0)
+
+
 def parse_sos(f: BinaryIO, length: int, metadata: JPEGMetadata) -> None:
     """Parse SOS (Start of Scan) segment."""
+    # 整段一次進 buffer (spectral selection 那 3 bytes 也包含在內)
+    data = _read_segment(f, length, "SOS segment")
     # Number of components in scan: 1 byte
-    num_components = read_u8(f)
-    
+    num_components = data[0]
+
     # For each component: 2 bytes
+    pos = 1
     for i in range(num_components):
         # Component selector: 1 byte (component ID)
-        component_id = read_u8(f)
+        component_id = data[pos]
         # Table mapping: 1 byte (upper 4 bits = DC table, lower 4 bits = AC table)
-        table_mapping = read_u8(f)
+        table_mapping = data[pos + 1]
+        pos += 2
         dc_table_id = (table_mapping >> 4) & 0x0F
         ac_table_id = table_mapping & 0x0F
-        
+
         # Store mapping (component_id is 1-indexed, array is 0-indexed)
         idx = component_id - 1
         if 0 <= idx < 3:
             metadata.table_mapping[idx] = (dc_table_id, ac_table_id)
-    
-    # Skip spectral selection and approximation (3 bytes)
-    # Start of spectral selection: 1 byte
-    # End of spectral selection: 1 byte
-    # Successive approximation: 1 byte
-    f.read(3)
+
+    # Spectral selection / approximation (3 bytes) 已在 buffer 裡，不需處理
 
 
 def marker_detector(path: str | Path, metadata: JPEGMetadata = None) -> JPEGMetadata:
@@ -215,46 +340,59 @@ def marker_detector(path: str | Path, metadata: JPEGMetadata = None) -> JPEGMeta
     """
     if metadata is None:
         metadata = JPEGMetadata()
-    
+
     with open(path, "rb") as f:
-        while True:
-            byte = f.read(1)
-            if not byte:
-                break  # End of file
-
-            if byte[0] != 0xFF:
-                continue  # Not a marker start
-
-            marker_byte = f.read(1)
-            if not marker_byte:
-                break  # End of file
-            marker = marker_byte[0]
-
-            if marker == 0x00:
-                continue  # Stuffed byte, not a marker
-            elif marker == 0xD8:  # SOI
-                print("Found SOI (Start of Image)")
-            elif marker == 0xD9:  # EOI
-                print("Found EOI (End of Image)")
-                break
-            else:
-                length = read_u16(f)
-                print(f"Found {marker_info(marker)} with length {length} bytes")
-                
-                # Parse segment data based on marker type
-                if marker == 0xE0:  # APP0
-                    parse_app0(f, length, metadata)
-                elif marker == 0xDB:  # DQT
-                    parse_dqt(f, length, metadata)
-                elif marker == 0xC4:  # DHT
-                    parse_dht(f, length, metadata)
-                elif marker == 0xC0:  # SOF0
-                    parse_sof0(f, length, metadata)
-                elif marker == 0xDA:  # SOS
-                    parse_sos(f, length, metadata)
+        # 整個檔案 mmap 進來，之後用 find / 索引逐 marker 跳，
+        # 不再一個 byte 一個 byte 的 f.read(1) (每次都是 Python call + syscall)
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            buf = b""  # 空檔案無法 mmap
+
+        try:
+            pos = 0
+            size = len(buf)
+            while True:
+                # 直接跳到下一個 0xFF，中間的非 marker bytes 一次略過
+                pos = buf.find(b"\xff", pos)
+                if pos < 0 or pos + 1 >= size:
+                    break  # End of file
+                marker = buf[pos + 1]
+                pos += 2
+
+                if marker == 0x00:
+                    continue  # Stuffed byte, not a marker
+                elif marker == 0xFF:
+                    pos -= 1  # Padding：第二個 0xFF 可能才是 marker 開頭
+                elif marker == 0xD8:  # SOI
+                    print("Found SOI (Start of Image)")
+                elif marker == 0xD9:  # EOI
+                    print("Found EOI (End of Image)")
+                    break
                 else:
-                    # Skip unknown segments
-                    f.read(length - 2)
+                    if pos + 2 > size:
+                        raise IOError("Unexpected length while reading 2 bytes")
+                    length = (buf[pos] << 8) | buf[pos + 1]
+                    pos += 2
+                    print(f"Found {marker_info(marker)} with length {length} bytes")
+
+                    # Parse segment data based on marker type
+                    # (parser 吃 file-like 物件，給它 segment 的 in-memory 切片)
+                    segment = io.BytesIO(buf[pos:pos + length - 2])
+                    if marker == 0xE0:  # APP0
+                        parse_app0(segment, length, metadata)
+                    elif marker == 0xDB:  # DQT
+                        parse_dqt(segment, length, metadata)
+                    elif marker == 0xC4:  # DHT
+                        parse_dht(segment, length, metadata)
+                    elif marker == 0xC0:  # SOF0
+                        parse_sof0(segment, length, metadata)
+                    elif marker == 0xDA:  # SOS
+                        parse_sos(segment, length, metadata)
+                    # 不支援的 marker 不用特別處理，pos 直接跳過整個 segment
+                    pos += length - 2
+        finally:
+            if isinstance(buf, mmap.mmap):
+                buf.close()
 
     return metadata
-            
\ No newline at end of file
@@ -1,4 +1,7 @@
 from typing import List
+
+import numpy as np
+
 from .image import Image
 
 def to_ppm(image: Image, filename: str = "out.ppm") -> None:
@@ -11,14 +14,9 @@ def to_ppm(image: Image, filename: str = "out.ppm") -> None:
         f.write(header.encode('ascii'))
         
         # 2. 寫入像素數據
-        # Image.pixels 是 [row][col] 的 Color 物件
-        for row in image.pixels:
-            for pixel in row:
-                # 確保數值在 0-255 之間 (雖然 Color 應該要是 int，但保險起見)
-                r = max(0, min(255, int(pixel.r)))
-                g = max(0, min(255, int(pixel.g)))
-                b = max(0, min(255, int(pixel.b)))
-                f.write(bytes([r, g, b]))
+        # Image.pixels 是 (H, W, 3) 的 uint8 ndarray，值已經 clamp 過，
+        # 整塊 buffer 一次寫出，不再每個 pixel 呼叫一次 f.write
+        f.write(np.ascontiguousarray(image.pixels).tobytes())
     from PIL import Image
 
     # 打開你的 PPM
@@ -1,13 +1,19 @@
 from dataclasses import dataclass, field
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
 
-# [[f32; 8]; 8]
-Block = List[List[float]]  # Represents an 8x8 block of floating numbers
+import numpy as np
 
-# [Vec<Vec<Block>>; 3]
-MCU = List[List[List[Block]]]  # Represents 3 components, each component is a 2D list of blocks
+# 一個 block 是 64 個 int16 係數的一維 ndarray (自然順序，讀檔時已 de-zigzag)
+Block = np.ndarray
 
-@dataclass
+# 一個 MCU 是 (所有 component 的 block 總數, 64) 的連續 int16 ndarray，
+# blocks 依 Y, Cb, Cr、component 內再依 v、h 的順序排列
+MCU = np.ndarray
+
+# fast lookup table 一次 peek 的位元數 (2^9 = 512 entries)
+HUFF_LOOKAHEAD = 9
+
+@dataclass(slots=True)
 class HuffmanTable:
     # dc_tables: [HashMap<(u8, u16), u8>; 2]
     # ac_tables: [HashMap<(u8, u16), u8>; 2]
@@ -17,14 +23,36 @@ class HuffmanTable:
     ac_tables: List[Dict[Tuple[int, int], int]] = field(
         default_factory=lambda: [dict(), dict()]
     )
+    # 長度 <= HUFF_LOOKAHEAD 的 code 直接查表：
+    # fast[peek] = (code 長度 << 8) | symbol，0xFFFF 表示要走慢速路徑
+    dc_fast: List[Optional[np.ndarray]] = field(
+        default_factory=lambda: [None, None]
+    )
+    ac_fast: List[Optional[np.ndarray]] = field(
+        default_factory=lambda: [None, None]
+    )
+    # Annex F 的 canonical 解碼陣列 (min_code, max_code, val_ptr, huffval)，
+    # 全部是 int32 ndarray：numba 的整段 entropy 解碼 kernel 直接吃，
+    # BitStream 的 Huffman 慢速路徑也用它做無 hash 的 canonical 解碼
+    dc_canon: List[Optional[tuple]] = field(
+        default_factory=lambda: [None, None]
+    )
+    ac_canon: List[Optional[tuple]] = field(
+        default_factory=lambda: [None, None]
+    )
+    # AC 專用的 fast table：code 長度 + size 都塞得進 lookahead 的 symbol，
+    # 一次查表同時拿到 (run 長度, 總共消耗幾個 bit, 解好的帶號數值)
+    fast_ac: List[Optional[list]] = field(
+        default_factory=lambda: [None, None]
+    )
 
-@dataclass
+@dataclass(slots=True)
 class ComponentInfo:
     horizontal_sampling: int = 0
     vertical_sampling: int = 0
     quantization_table_id: int = 0
 
-@dataclass
+@dataclass(slots=True)
 class SofInfo:
     precision: int = 0
     height: int = 0
@@ -35,7 +63,7 @@ class SofInfo:
     max_horizontal_sampling: int = 0
     max_vertical_sampling: int = 0
 
-@dataclass
+@dataclass(slots=True)
 class AppInfo:
     identifier: bytes = b"\x00" * 5
     version_major_id: int = 0
@@ -46,15 +74,20 @@ class AppInfo:
     x_thumbnail: int = 0
     y_thumbnail: int = 0
 
-@dataclass
+@dataclass(slots=True)
 class JPEGMetadata:
     app_info: AppInfo = field(default_factory=AppInfo)
     sof_info: SofInfo = field(default_factory=SofInfo)
     huffman_tables: HuffmanTable = field(default_factory=HuffmanTable)
-    # 4 quantization_tables each is a list of 64 floating numbers
-    quantization_tables: List[List[float]] = field(
-        default_factory=lambda: [[0.0] * 64 for _ in range(4)]
-    )  # List of quantization tables
+    # 4 張量化表存成一個 (4, 64) 的 uint16 ndarray (zigzag 順序)，
+    # 量化值是無號的 8/16-bit 整數 (16-bit 精度可以到 65535)；
+    # decoder 端需要時再一次轉 float32
+    quantization_tables: np.ndarray = field(
+        default_factory=lambda: np.zeros((4, 64), dtype=np.uint16)
+    )
     table_mapping: List[Tuple[int, int]] = field(
         default_factory=lambda: [(0, 0) for _ in range(3)]
-    )  # List of (dc_table_id, ac_table_id) for each component
\ No newline at end of file
+    )  # List of (dc_table_id, ac_table_id) for each component
+    # DRI 標記定義的 restart interval (每隔幾個 MCU 插一個 RST marker)，
+    # 0 表示沒有 restart marker
+    restart_interval: int = 0
\ No newline at end of file
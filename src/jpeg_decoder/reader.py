@@ -1,13 +1,25 @@
 from __future__ import annotations
 from typing import List, Tuple, Dict, BinaryIO
+import io
+import logging
+import re
 import struct
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-from .primitives import JPEGMetadata, MCU, Block, HuffmanTable
+import numpy as np
+
+from .primitives import JPEGMetadata, MCU, Block, HuffmanTable, HUFF_LOOKAHEAD
 from .marker import (
-    read_u8, read_u16, 
-    parse_dqt, parse_dht, parse_sof0, parse_sos, parse_app0
+    parse_dqt, parse_dht, parse_dri, parse_sof0, parse_sos, parse_app0
 )
 
+# numba 是選配：有裝就把整段 entropy 解碼編成原生碼，
+# 沒裝就走下面逐 bit 的 BitStream 路徑
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 # 定義 Marker 常數
 MARKER_PREFIX = 0xFF
 SOI_MARKER = 0xD8
@@ -17,150 +29,452 @@ DQT_MARKER = 0xDB
 DHT_MARKER = 0xC4
 SOF0_MARKER = 0xC0
 SOS_MARKER = 0xDA
+DRI_MARKER = 0xDD
+
+# RST0-RST7 (0xFFD0-0xFFD7)：restart interval 的分段點
+RST_PATTERN = re.compile(b"\xff[\xd0-\xd7]")
+
+# 解碼過程的訊息走 logging (預設不輸出)，不再直接 print 進 stdout
+logger = logging.getLogger(__name__)
+
+# 標準 JPEG zig-zag 順序：第 k 個讀到的係數放在 8x8 block
+# (攤平成 64) 的第 ZIGZAG[k] 格，解碼時直接寫成自然順序，
+# 下游就不再需要 de-zigzag 的 gather
+ZIGZAG = (
+     0,  1,  8, 16,  9,  2,  3, 10,
+    17, 24, 32, 25, 18, 11,  4,  5,
+    12, 19, 26, 33, 40, 48, 41, 34,
+    27, 20, 13,  6,  7, 14, 21, 28,
+    35, 42, 49, 56, 57, 50, 43, 36,
+    29, 22, 15, 23, 30, 37, 44, 51,
+    58, 59, 52, 45, 38, 31, 39, 46,
+    53, 60, 61, 54, 47, 55, 62, 63,
+)
+ZIGZAG_INDEX = np.array(ZIGZAG, dtype=np.int64)
+
+if njit is not None:
+    # nogil：restart interval 分段時可以用 thread pool 平行解多段
+    @njit(cache=True, nogil=True)
+    def _decode_scan(data, out, block_comp, zigzag,
+                     dc_min, dc_max, dc_ptr, dc_val,
+                     ac_min, ac_max, ac_ptr, ac_val):
+        """
+        整張圖的 entropy 解碼 kernel：bit buffer、canonical Huffman 解碼
+        (Annex F 的 MINCODE/MAXCODE/VALPTR)、magnitude 還原全部 inline，
+        係數經 zigzag 表直接以自然順序寫進預先配置好的 out[n_mcus, blocks, 64]。
+        回傳成功解完的 MCU 數，資料壞掉 (code 超過 16 bit) 時提前返回。
+        """
+        end = data.shape[0]
+        pos = 0
+        buf = 0
+        nbits = 0
+        last_dc = np.zeros(3, dtype=np.int32)
+        n_mcus = out.shape[0]
+        n_blocks = block_comp.shape[0]
+
+        for m in range(n_mcus):
+            for b in range(n_blocks):
+                comp = block_comp[b]
+
+                # --- DC：canonical 解碼 + 差分值還原 ---
+                if nbits == 0:
+                    if pos < end:
+                        buf = data[pos]
+                        pos += 1
+                    else:
+                        buf = 0  # 資料尾端：補 0 bit
+                    nbits = 8
+                nbits -= 1
+                code = (buf >> nbits) & 1
+                l = 1
+                while code > dc_max[comp, l]:
+                    l += 1
+                    if l > 16:
+                        return m
+                    if nbits == 0:
+                        if pos < end:
+                            buf = data[pos]
+                            pos += 1
+                        else:
+                            buf = 0
+                        nbits = 8
+                    nbits -= 1
+                    code = (code << 1) | ((buf >> nbits) & 1)
+                s = dc_val[comp, dc_ptr[comp, l] + code - dc_min[comp, l]]
+
+                diff = 0
+                if s > 0:
+                    v = 0
+                    for _ in range(s):
+                        if nbits == 0:
+                            if pos < end:
+                                buf = data[pos]
+                                pos += 1
+                            else:
+                                buf = 0
+                            nbits = 8
+                        nbits -= 1
+                        v = (v << 1) | ((buf >> nbits) & 1)
+                    if v < (1 << (s - 1)):
+                        v -= (1 << s) - 1
+                    diff = v
+                last_dc[comp] += diff
+                out[m, b, 0] = last_dc[comp]
+
+                # --- AC：同一套 canonical 解碼，zigzag 表轉自然順序寫入 ---
+                k = 1
+                while k < 64:
+                    if nbits == 0:
+                        if pos < end:
+                            buf = data[pos]
+                            pos += 1
+                        else:
+                            buf = 0
+                        nbits = 8
+                    nbits -= 1
+                    code = (buf >> nbits) & 1
+                    l = 1
+                    while code > ac_max[comp, l]:
+                        l += 1
+                        if l > 16:
+                            return m
+                        if nbits == 0:
+                            if pos < end:
+                                buf = data[pos]
+                                pos += 1
+                            else:
+                                buf = 0
+                            nbits = 8
+                        nbits -= 1
+                        code = (code << 1) | ((buf >> nbits) & 1)
+                    sym = ac_val[comp, ac_ptr[comp, l] + code - ac_min[comp, l]]
+
+                    if sym == 0x00:
+                        break  # EOB
+                    if sym == 0xF0:
+                        k += 16  # ZRL：16 個零，沒有接 magnitude (Annex F)
+                        continue
+
+                    k += sym >> 4
+                    if k >= 64:
+                        break
+                    size = sym & 0x0F
+                    v = 0
+                    for _ in range(size):
+                        if nbits == 0:
+                            if pos < end:
+                                buf = data[pos]
+                                pos += 1
+                            else:
+                                buf = 0
+                            nbits = 8
+                        nbits -= 1
+                        v = (v << 1) | ((buf >> nbits) & 1)
+                    if v < (1 << (size - 1)):
+                        v -= (1 << size) - 1
+                    out[m, b, zigzag[k]] = v
+                    k += 1
+        return n_mcus
+else:
+    _decode_scan = None
 
 class BitStream:
-    """處理位元流讀取與 Byte Stuffing (0xFF00)"""
-    def __init__(self, f: BinaryIO):
-        self.f = f
-        self.current_byte = 0
-        self.bit_count = 0  # 目前這個 byte 剩幾個 bit 還沒讀
-        # 用來記錄每個 component 的上一個 DC 值 (Y, Cb, Cr)
-        self.last_dc = [0.0, 0.0, 0.0] 
+    """讀取已經去除 Byte Stuffing (0xFF00) 的 entropy 位元流"""
+    # slot 化之後屬性存取不走 instance dict，
+    # 對每個 bit 都要碰 self.buf/self.nbits 的熱路徑有感
+    __slots__ = ("data", "pos", "buf", "nbits", "last_dc")
+
+    def __init__(self, data: bytes):
+        # 整段 entropy 資料一次進來 (destuff 已在外面做完)，
+        # 之後只剩 bytes 索引，沒有任何 I/O 呼叫
+        self.data = data
+        self.pos = 0
+        # 64-bit 位元緩衝：一次塞好幾個 byte，不再每 8 bit 讀一次檔案
+        self.buf = 0
+        self.nbits = 0  # buffer 裡還有幾個 bit 沒消耗
+        # 用來記錄每個 component 的上一個 DC 值 (Y, Cb, Cr)；
+        # DC 差分本來就是整數，維持 int 就不用每次累加都 box PyFloat
+        self.last_dc = [0, 0, 0]
+
+    def _refill(self) -> None:
+        """把位元緩衝補到 56 bit 以上 (或讀完 entropy 資料)。"""
+        nbits = self.nbits
+        if nbits > 56:
+            return
+        # 丟掉已經消耗掉的高位 bits，buffer 才不會越長越大
+        buf = self.buf & ((1 << nbits) - 1)
+        data = self.data
+        pos = self.pos
+        end = len(data)
+        while nbits <= 56 and pos < end:
+            buf = (buf << 8) | data[pos]
+            pos += 1
+            nbits += 8
+        self.buf = buf
+        self.nbits = nbits
+        self.pos = pos
 
     def get_bit(self) -> int:
-        if self.bit_count == 0:
-            # 讀取一個新的 byte
-            b_data = self.f.read(1)
-            if not b_data:
+        if self.nbits == 0:
+            self._refill()
+            if self.nbits == 0:
                 raise EOFError("Unexpected End of Stream")
-            
-            self.current_byte = b_data[0]
-            
-            # 處理 JPEG 的 Byte Stuffing：如果讀到 0xFF，後面必須是 0x00
-            if self.current_byte == 0xFF:
-                check_byte = self.f.read(1)
-                if check_byte and check_byte[0] != 0x00:
-                    # 在標準 JPEG 中，Entropy 數據裡的 0xFF 後面一定是 0x00
-                    # 如果不是，通常代表數據流結束或遇到 RST 標記
-                    # 這裡簡化處理，視為錯誤或略過
-                    print(f"Warning: 0xFF followed by {hex(check_byte[0])} inside bitstream")
-            
-            self.bit_count = 8
 
         # 取出最高位 (Big Endian)
-        bit = (self.current_byte >> (self.bit_count - 1)) & 1
-        self.bit_count -= 1
-        return bit
+        self.nbits -= 1
+        return (self.buf >> self.nbits) & 1
 
-    def match_huffman(self, table: Dict[Tuple[int, int], int]) -> int:
+    def match_huffman(self, table: Dict[Tuple[int, int], int], fast_table=None, canon=None) -> int:
         """根據霍夫曼表讀取下一個符號"""
+        # 快速路徑：peek HUFF_LOOKAHEAD 個 bit 直接查表，
+        # 常見的短 code (絕大多數的 AC symbol) 一次命中，不用逐 bit 走
+        if fast_table is not None:
+            self._refill()
+            nbits = self.nbits
+            if nbits >= HUFF_LOOKAHEAD:
+                peek = (self.buf >> (nbits - HUFF_LOOKAHEAD)) & 0x1FF
+            elif nbits > 0:
+                # 資料流尾端不足 9 bit：右側補 0 之後 peek
+                peek = (self.buf << (HUFF_LOOKAHEAD - nbits)) & 0x1FF
+            else:
+                raise EOFError("Unexpected End of Stream")
+            entry = int(fast_table[peek])
+            if entry != 0xFFFF:
+                length = entry >> 8
+                if length <= nbits:
+                    self.nbits = nbits - length
+                    return entry & 0xFF
+
+        # 慢速路徑：canonical 解碼 (Annex F)。
+        # 不逐 bit 走 get_bit：位元緩衝已經有足夠的 bit，
+        # 每個候選長度 l 直接 shift + mask peek 出 l-bit 的 code，
+        # code <= max_code[l] 就能用 val_ptr[l] + code - min_code[l]
+        # 索引到 symbol，完全不用 hash (max_code 未使用的長度是 -1)
+        if canon is not None:
+            min_code, max_code, val_ptr, huffval = canon
+            self._refill()
+            nbits = self.nbits
+            buf = self.buf
+            for length in range(1, 17):
+                if length > nbits:
+                    raise EOFError("Unexpected End of Stream")
+                code = (buf >> (nbits - length)) & ((1 << length) - 1)
+                if code <= max_code[length]:
+                    self.nbits = nbits - length
+                    return huffval[val_ptr[length] + code - min_code[length]]
+            raise ValueError(f"Huffman decoding failed. Code: {bin(code)}")
+
         code = 0
         length = 0
         while length < 16:
             length += 1
             code = (code << 1) | self.get_bit()
-            
+
             if (length, code) in table:
                 return table[(length, code)]
-        
+
         raise ValueError(f"Huffman decoding failed. Code: {bin(code)}")
 
-    def read_value(self, length: int) -> float:
+    def read_value(self, length: int) -> int:
         """讀取指定長度的數值 (處理正負號)"""
         if length == 0:
-            return 0.0
-        
-        first_bit = self.get_bit()
-        val = 1  # 這裡只是一個 placeholder，實際邏輯如下
-        
-        # 已經讀了 1 bit
-        current_val = first_bit
-        for _ in range(length - 1):
-            current_val = (current_val << 1) | self.get_bit()
-            
+            return 0
+
+        # 位元緩衝裡一次 shift + mask 就能取出整個 magnitude，
+        # 不用逐 bit 呼叫 get_bit
+        self._refill()
+        nbits = self.nbits
+        if nbits < length:
+            raise EOFError("Unexpected End of Stream")
+        v = (self.buf >> (nbits - length)) & ((1 << length) - 1)
+        self.nbits = nbits - length
+
         # 判斷正負：若首位是 1，則是正數；若首位是 0，則需要轉換
         # JPEG 的規則：如果是負數，其值為 (val - (2^length - 1))
-        if first_bit == 1:
-            return float(current_val)
-        else:
-            return float(current_val - ((1 << length) - 1))
+        if v < (1 << (length - 1)):
+            return v - ((1 << length) - 1)
+        return v
 
-    def read_dc(self, table: Dict[Tuple[int, int], int], component_id: int) -> float:
-        length = self.match_huffman(table)
+    def read_dc(self, table: Dict[Tuple[int, int], int], component_id: int, fast_table=None, canon=None) -> int:
+        length = self.match_huffman(table, fast_table, canon)
         if length == 0:
-            diff = 0.0
+            diff = 0
         else:
             diff = self.read_value(length)
-        
+
         # DC 值是累加的
         self.last_dc[component_id] += diff
         return self.last_dc[component_id]
 
-    def read_ac(self, table: Dict[Tuple[int, int], int]) -> Tuple[int, float]:
+    def read_ac(self, table: Dict[Tuple[int, int], int], fast_table=None, fast_ac=None, canon=None) -> Tuple[int, int]:
         """回傳 (前面的 0 的個數, 數值)"""
-        s = self.match_huffman(table)
-        
+        # fast-AC 路徑：Huffman code + magnitude bits 一次從 buffer 取出，
+        # 查表直接拿到 (run, 消耗 bit 數, 帶號數值)
+        if fast_ac is not None:
+            self._refill()
+            nbits = self.nbits
+            if nbits >= HUFF_LOOKAHEAD:
+                entry = fast_ac[(self.buf >> (nbits - HUFF_LOOKAHEAD)) & 0x1FF]
+                if entry is not None:
+                    run, used, value = entry
+                    self.nbits = nbits - used
+                    return (run, value)
+
+        s = self.match_huffman(table, fast_table, canon)
+
         if s == 0x00:
-            return (-1, 0.0) # EOB (End of Block)
+            return (-1, 0) # EOB (End of Block)
         elif s == 0xF0:
-            return (16, 0.0) # ZRL (16 zeros)
+            return (16, 0) # ZRL (16 zeros)
         else:
             num_zeros = s >> 4
             category = s & 0x0F
             val = self.read_value(category)
             return (num_zeros, val)
 
-def read_mcu(bit_stream: BitStream, metadata: JPEGMetadata) -> MCU:
-    # 建立一個空的 MCU 結構: [Component][Block_Row][Block_Col] -> Block(8x8)
-    mcu = [] 
-    
+def read_mcu(bit_stream: BitStream, metadata: JPEGMetadata, mcu: MCU,
+             y_tables, cb_tables, cr_tables) -> MCU:
+    """任意取樣配置的 MCU 解碼：mcu 是呼叫端預先清零的 (blocks, 64)
+    int16 slice (自然順序)。表跟 specialized reader 一樣由呼叫端用
+    _component_tables 綁好一次 (canonical 陣列已是 Python list)，
+    這裡只照取樣因子逐 block 呼叫 _read_block"""
+    components = metadata.sof_info.components
+    tables = (y_tables, cb_tables, cr_tables)
+
     # 依序處理 Y, Cb, Cr 三個分量
+    b = 0
     for i in range(3):
-        comp_info = metadata.sof_info.components[i]
-        h_samp = comp_info.horizontal_sampling
-        v_samp = comp_info.vertical_sampling
-        
-        # 取得對應的 Huffman Table ID
-        dc_table_id = metadata.table_mapping[i][0]
-        ac_table_id = metadata.table_mapping[i][1]
-        
-        dc_table = metadata.huffman_tables.dc_tables[dc_table_id]
-        ac_table = metadata.huffman_tables.ac_tables[ac_table_id]
-
-        comp_data = [] # 儲存這個 component 下的所有 blocks
-
-        for v in range(v_samp):
-            row_blocks = []
-            for h in range(h_samp):
-                # 初始化 8x8 block
-                block = [[0.0] * 8 for _ in range(8)]
-                
-                # 1. 讀取 DC
-                block[0][0] = bit_stream.read_dc(dc_table, i)
-                
-                # 2. 讀取 AC
-                idx = 1
-                while idx < 64:
-                    zeros, val = bit_stream.read_ac(ac_table)
-                    
-                    if zeros == -1: # EOB
-                        break
-                    
-                    idx += zeros
-                    if idx >= 64:
-                        break
-                        
-                    block[idx // 8][idx % 8] = val
-                    idx += 1
-                
-                row_blocks.append(block)
-            comp_data.append(row_blocks)
-        mcu.append(comp_data)
-    
+        comp_info = components[i]
+        for _ in range(comp_info.vertical_sampling * comp_info.horizontal_sampling):
+            _read_block(bit_stream, mcu[b], i, tables[i])
+            b += 1
+
+    return mcu
+
+def _canon_lists(canon):
+    """canonical 解碼陣列轉成 Python list：
+    BitStream 逐元素索引 list 比索引 ndarray 便宜不少"""
+    if canon is None:
+        return None
+    return tuple(a.tolist() for a in canon)
+
+def _component_tables(metadata: JPEGMetadata, i: int):
+    """把 component i 會用到的所有 Huffman 表整理成一個 tuple，
+    specialized reader 綁定一次之後就不用再走 metadata 的屬性鏈"""
+    dc_id, ac_id = metadata.table_mapping[i]
+    huff = metadata.huffman_tables
+    return (
+        huff.dc_tables[dc_id], huff.dc_fast[dc_id], _canon_lists(huff.dc_canon[dc_id]),
+        huff.ac_tables[ac_id], huff.ac_fast[ac_id], huff.fast_ac[ac_id],
+        _canon_lists(huff.ac_canon[ac_id]),
+    )
+
+def _read_block(bit_stream: BitStream, block, comp_id: int, tables) -> None:
+    """解一個 8x8 block 到預先清零的一維 block 裡 (ZIGZAG 表轉自然順序)"""
+    dc_table, dc_fast, dc_canon, ac_table, ac_fast, fast_ac, ac_canon = tables
+    block[0] = bit_stream.read_dc(dc_table, comp_id, dc_fast, dc_canon)
+    read_ac = bit_stream.read_ac
+    zigzag = ZIGZAG
+    idx = 1
+    while idx < 64:
+        zeros, val = read_ac(ac_table, ac_fast, fast_ac, ac_canon)
+        if zeros == -1: # EOB
+            break
+        if zeros == 16: # ZRL：16 個零，沒有接 magnitude (Annex F)
+            idx += 16
+            continue
+        idx += zeros
+        if idx >= 64:
+            break
+        block[zigzag[idx]] = val
+        idx += 1
+
+def read_mcu_420(bit_stream: BitStream, mcu: MCU, y_tables, cb_tables, cr_tables) -> MCU:
+    """4:2:0 (Y 2x2、色度各 1x1) 專用的 MCU 解碼：
+    六個 block (Y0..Y3, Cb, Cr) 直接展開寫進預先清零的 mcu slice，
+    表都是呼叫端綁好的 locals"""
+    _read_block(bit_stream, mcu[0], 0, y_tables)
+    _read_block(bit_stream, mcu[1], 0, y_tables)
+    _read_block(bit_stream, mcu[2], 0, y_tables)
+    _read_block(bit_stream, mcu[3], 0, y_tables)
+    _read_block(bit_stream, mcu[4], 1, cb_tables)
+    _read_block(bit_stream, mcu[5], 2, cr_tables)
+    return mcu
+
+def read_mcu_111(bit_stream: BitStream, mcu: MCU, y_tables, cb_tables, cr_tables) -> MCU:
+    """4:4:4 (三個分量都 1x1) 專用的 MCU 解碼，三個 block 直接展開"""
+    _read_block(bit_stream, mcu[0], 0, y_tables)
+    _read_block(bit_stream, mcu[1], 1, cb_tables)
+    _read_block(bit_stream, mcu[2], 2, cr_tables)
     return mcu
 
-def read_mcus(f: BinaryIO, metadata: JPEGMetadata) -> List[List[MCU]]:
-    """讀取所有 MCU"""
+def _decode_mcu_sequence(entropy: bytes, metadata: JPEGMetadata, n_mcus: int) -> np.ndarray:
+    """
+    用 BitStream 解碼一段 entropy bytes 裡連續的 n_mcus 個 MCU，
+    回傳 (n_mcus, blocks, 64) 的 int16 陣列。
+    DC 累計從 0 開始，正好就是 restart 之後的狀態，
+    所以整張圖和 RST 之間的任一段都能用同一個函式解。
+    """
+    bit_stream = BitStream(entropy)
+    sof = metadata.sof_info
+
+    # 取樣模式在 SOF0 之後就固定了：常見的 4:2:0 / 4:4:4 走
+    # 展開好的 specialized reader，表在迴圈外綁定一次
+    samp = tuple(
+        (sof.components[i].vertical_sampling, sof.components[i].horizontal_sampling)
+        for i in range(3)
+    )
+    y_tables, cb_tables, cr_tables = (_component_tables(metadata, i) for i in range(3))
+    if samp == ((2, 2), (1, 1), (1, 1)):
+        next_mcu = read_mcu_420
+    elif samp == ((1, 1), (1, 1), (1, 1)):
+        next_mcu = read_mcu_111
+    else:
+        def next_mcu(bs, mcu, y, cb, cr):
+            return read_mcu(bs, metadata, mcu, y, cb, cr)
+
+    # 整段的係數一次配置好，每個 MCU 直接寫進自己的 slice，
+    # 不再逐 MCU 配置小陣列再 np.array() 收集
+    n_blocks = sum(v * h for v, h in samp)
+    out = np.zeros((n_mcus, n_blocks, 64), dtype=np.int16)
+    for k in range(n_mcus):
+        try:
+            next_mcu(bit_stream, out[k], y_tables, cb_tables, cr_tables)
+        except Exception as e:
+            logger.warning("Error reading MCU %d: %s", k, e)
+            raise e
+
+    return out
+
+def extract_entropy_segment(f: BinaryIO) -> bytes:
+    """
+    掃描階段：把 SOS 之後的 entropy 資料一次讀進來，
+    掃到第一個會結束 scan 的 marker (0xFF 後面不是 0x00 也不是 RST) 為止。
+    回傳原始的 scan bytes (stuffing 和 RST marker 都還在 —
+    destuffing 必須在依 RST 切段「之後」做，否則 0xFF00 去掉以後
+    資料裡會冒出假的 0xFFD0-0xFFD7)；
+    檔案指標會停在 marker 開頭，讓 data_reader 繼續掃到 EOI。
+    """
+    raw = f.read()
+    end = len(raw)
+    i = 0
+    while True:
+        i = raw.find(b"\xff", i)
+        if i < 0 or i + 1 >= len(raw):
+            break
+        nxt = raw[i + 1]
+        if nxt == 0x00 or 0xD0 <= nxt <= 0xD7:
+            i += 2  # 0xFF00 stuffing 或 RST marker，都屬於 scan 資料
+            continue
+        end = i
+        break
+
+    f.seek(end - len(raw), 1)
+    return raw[:end]
+
+def read_mcus(scan: bytes, metadata: JPEGMetadata) -> np.ndarray:
+    """解碼整段 scan bytes (仍含 stuffing / RST marker)，
+    回傳 (h_mcus, w_mcus, blocks, 64) 的 int16 係數陣列"""
     sof = metadata.sof_info
     max_h = sof.max_horizontal_sampling
     max_v = sof.max_vertical_sampling
@@ -172,73 +486,152 @@ def read_mcus(f: BinaryIO, metadata: JPEGMetadata) -> List[List[MCU]]:
     w_mcus = (sof.width + mcu_width - 1) // mcu_width
     h_mcus = (sof.height + mcu_height - 1) // mcu_height
     
-    print(f"Image Size: {sof.width}x{sof.height}")
-    print(f"MCU Grid: {w_mcus}x{h_mcus}")
-    
-    bit_stream = BitStream(f)
-    
-    mcus = []
-    for r in range(h_mcus):
-        row_mcus = []
-        for c in range(w_mcus):
-            try:
-                mcu = read_mcu(bit_stream, metadata)
-                row_mcus.append(mcu)
-            except Exception as e:
-                print(f"Error reading MCU at ({r}, {c}): {e}")
-                raise e
-        mcus.append(row_mcus)
-        
-    return mcus
-
-def data_reader(f: BinaryIO) -> Tuple[JPEGMetadata, List[List[MCU]]]:
+    logger.debug("Image Size: %dx%d", sof.width, sof.height)
+    logger.debug("MCU Grid: %dx%d", w_mcus, h_mcus)
+
+    n_mcus = h_mcus * w_mcus
+
+    # 有 DRI 就把 scan 依 RST marker 切段：每段的 DC 累計
+    # 都從 0 重新開始，段與段之間完全獨立，可以平行解碼。
+    # destuffing 一定要在切段之後做 (見 extract_entropy_segment)
+    ri = metadata.restart_interval
+    if ri > 0:
+        chunks = [
+            c.replace(b"\xff\x00", b"\xff") for c in RST_PATTERN.split(scan)
+        ]
+        counts = []
+        remaining = n_mcus
+        for _ in chunks:
+            counts.append(min(ri, remaining))
+            remaining -= counts[-1]
+        if remaining != 0:
+            raise IOError("Restart marker count does not match MCU grid")
+    else:
+        chunks = [scan.replace(b"\xff\x00", b"\xff")]
+        counts = [n_mcus]
+
+    # 有 numba 就把每段 scan 丟給編譯過的 kernel 解，
+    # 多段時 kernel 是 nogil 的，用 thread pool 真平行
+    huff = metadata.huffman_tables
+    if _decode_scan is not None and all(
+        huff.dc_canon[metadata.table_mapping[i][0]] is not None
+        and huff.ac_canon[metadata.table_mapping[i][1]] is not None
+        for i in range(3)
+    ):
+        v_samps = [sof.components[i].vertical_sampling for i in range(3)]
+        h_samps = [sof.components[i].horizontal_sampling for i in range(3)]
+        block_comp = np.array(
+            [i for i in range(3) for _ in range(v_samps[i] * h_samps[i])],
+            dtype=np.int32,
+        )
+        # 每個 component 對應的 canonical 表堆成 (3, ...) 的陣列
+        dc_canons = [huff.dc_canon[metadata.table_mapping[i][0]] for i in range(3)]
+        ac_canons = [huff.ac_canon[metadata.table_mapping[i][1]] for i in range(3)]
+        dc_min, dc_max, dc_ptr, dc_val = (
+            np.stack([t[j] for t in dc_canons]) for j in range(4)
+        )
+        ac_min, ac_max, ac_ptr, ac_val = (
+            np.stack([t[j] for t in ac_canons]) for j in range(4)
+        )
+
+        out = np.zeros((n_mcus, len(block_comp), 64), dtype=np.int16)
+
+        def decode_chunk(chunk, start, count):
+            done = _decode_scan(
+                np.frombuffer(chunk, dtype=np.uint8).astype(np.int64),
+                out[start:start + count],
+                block_comp, ZIGZAG_INDEX,
+                dc_min, dc_max, dc_ptr, dc_val,
+                ac_min, ac_max, ac_ptr, ac_val,
+            )
+            if done != count:
+                raise EOFError(f"Entropy decode failed at MCU {start + done}/{n_mcus}")
+
+        if len(chunks) > 1:
+            starts = [sum(counts[:k]) for k in range(len(chunks))]
+            with ThreadPoolExecutor() as pool:
+                futures = [
+                    pool.submit(decode_chunk, chunk, start, count)
+                    for chunk, start, count in zip(chunks, starts, counts)
+                ]
+                for future in futures:
+                    future.result()
+        else:
+            decode_chunk(chunks[0], 0, n_mcus)
+
+        # kernel 的輸出本來就是目標格式，直接 reshape 成 MCU 網格
+        return out.reshape(h_mcus, w_mcus, len(block_comp), 64)
+
+    # BitStream 路徑：多段時每段丟給一個 worker process
+    # (各自的 BitStream / last_dc，不需要鎖；ProcessPool 繞開 GIL)
+    if len(chunks) > 1:
+        with ProcessPoolExecutor() as pool:
+            parts = list(
+                pool.map(_decode_mcu_sequence, chunks, [metadata] * len(chunks), counts)
+            )
+        flat = np.concatenate(parts)
+    else:
+        flat = _decode_mcu_sequence(chunks[0], metadata, n_mcus)
+
+    return flat.reshape(h_mcus, w_mcus, -1, 64)
+
+def data_reader(f: BinaryIO) -> Tuple[JPEGMetadata, np.ndarray]:
     """主要的讀取入口"""
     metadata = JPEGMetadata()
-    mcus = []
-    
+    mcus = np.zeros((0, 0, 0, 64), dtype=np.int16)
+
+    # 整個檔案一次進 buffer：marker 掃描用 bytes.find 直接跳到
+    # 下一個 0xFF，不再逐 byte f.read(1)；區段內容則透過同一個
+    # BytesIO 交給既有的 parse_* (它們吃 file-like 介面)
+    raw = f.read()
+    bio = io.BytesIO(raw)
+    n = len(raw)
+    pos = 0
+
     while True:
-        # 1. 讀取 0xFF
-        b = f.read(1)
-        if not b: 
-            break
-        if b[0] != MARKER_PREFIX:
-            continue
-            
-        # 2. 讀取 Marker 類型
-        b = f.read(1)
-        if not b: 
+        # 跳到下一個 marker candidate
+        pos = raw.find(b"\xff", pos)
+        if pos < 0 or pos + 1 >= n:
             break
-        marker = b[0]
-        
+        marker = raw[pos + 1]
+        pos += 2
+
         if marker == SOI_MARKER:
-            print("SOI found")
+            logger.debug("SOI found")
         elif marker == EOI_MARKER:
-            print("EOI found")
+            logger.debug("EOI found")
             break
         elif marker == 0x00:
             continue # stuffed byte
         else:
             # 讀取區段長度
-            length = read_u16(f)
-            print(f"Marker {hex(marker)} length {length}")
-            
+            if pos + 2 > n:
+                break
+            length = (raw[pos] << 8) | raw[pos + 1]
+            logger.debug("Marker %s length %d", hex(marker), length)
+
+            bio.seek(pos + 2)
             if marker == APP0_MARKER:
-                parse_app0(f, length, metadata)
+                parse_app0(bio, length, metadata)
             elif marker == DQT_MARKER:
-                parse_dqt(f, length, metadata)
+                parse_dqt(bio, length, metadata)
             elif marker == DHT_MARKER:
-                parse_dht(f, length, metadata)
+                parse_dht(bio, length, metadata)
+            elif marker == DRI_MARKER:
+                parse_dri(bio, length, metadata)
             elif marker == SOF0_MARKER:
-                parse_sof0(f, length, metadata)
+                parse_sof0(bio, length, metadata)
             elif marker == SOS_MARKER:
-                parse_sos(f, length, metadata)
-                # SOS 之後緊接著就是壓縮數據，開始解碼 MCU
-                print("Start decoding MCUs...")
-                mcus = read_mcus(f, metadata)
-                # 讀完數據後通常就結束了，或者後面緊接 EOI
-                # 我們這裡可以直接 break 或者繼續 loop 找 EOI
-            else:
-                # 跳過不支援的標記
-                f.read(length - 2)
-                
+                parse_sos(bio, length, metadata)
+                # SOS 之後緊接著就是壓縮數據：先掃出 scan 區段
+                # (scanner)，再交給 read_mcus 解碼 (parser)
+                logger.debug("Start decoding MCUs...")
+                scan = extract_entropy_segment(bio)
+                mcus = read_mcus(scan, metadata)
+                # scan 結束後 bio 停在下一個 marker 開頭，從那裡繼續掃
+                pos = bio.tell()
+                continue
+            # 不論有沒有解析，都直接跳過整個區段
+            pos += length
+
     return metadata, mcus
\ No newline at end of file
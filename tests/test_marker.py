@@ -8,13 +8,17 @@ from jpeg_decoder.marker import (
     parse_app0,
     parse_dqt,
     parse_dht,
+    parse_dri,
     parse_sof0,
     parse_sos,
     marker_detector,
     read_u8,
     read_u16,
+    build_fast_huffman_table,
+    build_fast_ac_table,
 )
-from jpeg_decoder.primitives import JPEGMetadata
+from jpeg_decoder.primitives import JPEGMetadata, HUFF_LOOKAHEAD
+from jpeg_decoder.reader import _decode_mcu_sequence
 
 
 class TestParseApp0:
@@ -141,6 +145,21 @@ class TestParseDqt:
         for i in range(64):
             assert metadata.quantization_tables[0][i] == float(i * 4)
 
+    def test_parse_16bit_table_upper_range(self):
+        """Test that 16-bit values above 32767 don't wrap negative."""
+        # Table info: precision=1 (16-bit), table_id=0
+        table_info = b"\x10"
+        # 64 copies of 40000 (0x9C40)
+        quant_values = b"\x9C\x40" * 64
+        dqt_data = table_info + quant_values
+
+        f = io.BytesIO(dqt_data)
+        metadata = JPEGMetadata()
+
+        parse_dqt(f, len(dqt_data) + 2, metadata)
+
+        assert all(v == 40000 for v in metadata.quantization_tables[0])
+
     def test_parse_multiple_tables(self):
         """Test parsing multiple quantization tables in one segment."""
         # First table: ID 0
@@ -241,16 +260,90 @@ class TestParseDht:
         # AC table 0
         ac0 = b"\x10" + bytes([1] + [0] * 15) + b"\x01"
         dht_data = dc0 + ac0
-        
+
         f = io.BytesIO(dht_data)
         metadata = JPEGMetadata()
-        
+
         parse_dht(f, len(dht_data) + 2, metadata)
-        
+
         assert metadata.huffman_tables.dc_tables[0][(1, 0)] == 0
         assert metadata.huffman_tables.ac_tables[0][(1, 0)] == 1
 
 
+class TestBuildFastHuffmanTable:
+    """Tests for the direct-indexed fast Huffman lookup table."""
+
+    def test_short_code_fills_all_suffixes(self):
+        """A code of length L should cover every peek sharing its prefix."""
+        # 1-bit code 0 -> symbol 5
+        fast = build_fast_huffman_table({(1, 0): 5})
+        # Every peek starting with bit 0 resolves to (length=1, symbol=5)
+        for fill in range(1 << (HUFF_LOOKAHEAD - 1)):
+            assert fast[fill] == (1 << 8) | 5
+        # Peeks starting with bit 1 are misses
+        for fill in range(1 << (HUFF_LOOKAHEAD - 1)):
+            assert fast[(1 << (HUFF_LOOKAHEAD - 1)) + fill] == 0xFFFF
+
+    def test_long_code_left_as_miss(self):
+        """Codes longer than HUFF_LOOKAHEAD stay on the slow path."""
+        fast = build_fast_huffman_table({(16, 0xFFFE): 7})
+        assert (fast == 0xFFFF).all()
+
+    def test_parse_dht_builds_fast_tables(self):
+        """parse_dht should populate dc_fast/ac_fast alongside the dicts."""
+        dht_data = b"\x00" + bytes([1, 1] + [0] * 14) + b"\x00\x01"
+        f = io.BytesIO(dht_data)
+        metadata = JPEGMetadata()
+
+        parse_dht(f, len(dht_data) + 2, metadata)
+
+        fast = metadata.huffman_tables.dc_fast[0]
+        assert fast is not None
+        # 1-bit code 0 -> symbol 0
+        assert fast[0] == (1 << 8) | 0
+        # 2-bit code 10 -> symbol 1
+        peek = 0b10 << (HUFF_LOOKAHEAD - 2)
+        assert fast[peek] == (2 << 8) | 1
+
+
+class TestBuildFastAcTable:
+    """Tests for the combined Huffman + magnitude fast-AC table."""
+
+    def test_entry_decodes_run_and_signed_value(self):
+        """Symbols whose code + size fit the lookahead decode in one step."""
+        # 2-bit code 10 -> symbol 0x23 (run=2, size=3)
+        fast_ac = build_fast_ac_table({(2, 0b10): 0x23})
+        # peek = code(10) + magnitude(101=5) + padding
+        peek = (0b10101 << (HUFF_LOOKAHEAD - 5))
+        assert fast_ac[peek] == (2, 5, 5.0)
+        # magnitude 010 has MSB 0 -> negative: 2 - (2^3 - 1) = -5
+        peek = (0b10010 << (HUFF_LOOKAHEAD - 5))
+        assert fast_ac[peek] == (2, 5, -5.0)
+
+    def test_eob_and_oversized_left_as_miss(self):
+        """EOB (size=0) and entries exceeding the lookahead stay None."""
+        # 2-bit code 0 -> EOB; 3-bit code 110 -> symbol 0x18 (size 8, 3+8 > 9)
+        fast_ac = build_fast_ac_table({(2, 0b00): 0x00, (3, 0b110): 0x18})
+        assert all(entry is None for entry in fast_ac)
+
+
+class TestParseDri:
+    """Tests for parse_dri function."""
+
+    def test_parse_restart_interval(self):
+        """A DRI segment should store the 2-byte restart interval."""
+        f = io.BytesIO(b"\x00\x08")
+        metadata = JPEGMetadata()
+
+        parse_dri(f, 4, metadata)
+
+        assert metadata.restart_interval == 8
+
+    def test_default_is_disabled(self):
+        """Without a DRI marker the restart interval stays 0."""
+        assert JPEGMetadata().restart_interval == 0
+
+
 class TestParseSof0:
     """Tests for parse_sof0 function."""
 
@@ -565,3 +658,51 @@ class TestHelperFunctions:
         f = io.BytesIO(b"\x12\x34")
         assert read_u16(f) == 0x1234
 
+
+
+class TestDecodeMcuGenericSampling:
+    """Tests for the generic BitStream MCU reader (non-4:2:0/4:4:4 layouts)."""
+
+    @staticmethod
+    def _make_metadata():
+        """Build metadata for a 4:2:2 scan whose DC code is longer than
+        HUFF_LOOKAHEAD, so decoding must take the canonical slow path."""
+        metadata = JPEGMetadata()
+
+        # DC table 0: a single 10-bit code (ten 0 bits) -> symbol 2 (size 2)
+        dc_data = b"\x00" + bytes([0] * 9 + [1] + [0] * 6) + b"\x02"
+        parse_dht(io.BytesIO(dc_data), len(dc_data) + 2, metadata)
+        # AC table 0: a single 1-bit code 0 -> symbol 0x00 (EOB)
+        ac_data = b"\x10" + bytes([1] + [0] * 15) + b"\x00"
+        parse_dht(io.BytesIO(ac_data), len(ac_data) + 2, metadata)
+
+        # 4:2:2 sampling: Y is 2x1, Cb/Cr are 1x1 -> 4 blocks per MCU
+        sof = metadata.sof_info
+        sof.components[0].horizontal_sampling = 2
+        sof.components[0].vertical_sampling = 1
+        for i in (1, 2):
+            sof.components[i].horizontal_sampling = 1
+            sof.components[i].vertical_sampling = 1
+        sof.max_horizontal_sampling = 2
+        sof.max_vertical_sampling = 1
+        return metadata
+
+    def test_decode_422_mcu_via_long_dc_code(self):
+        """A 4:2:2 MCU with >HUFF_LOOKAHEAD DC codes decodes correctly."""
+        metadata = self._make_metadata()
+
+        # Per block: 10-bit DC code, magnitude bits "11" (= +3), 1-bit EOB
+        bits = ("0" * 10 + "11" + "0") * 4
+        bits += "0" * (-len(bits) % 8)
+        entropy = int(bits, 2).to_bytes(len(bits) // 8, "big")
+
+        mcus = _decode_mcu_sequence(entropy, metadata, 1)
+
+        assert mcus.shape == (1, 4, 64)
+        # Y DC accumulates across the two Y blocks; chroma starts fresh
+        assert mcus[0, 0, 0] == 3
+        assert mcus[0, 1, 0] == 6
+        assert mcus[0, 2, 0] == 3
+        assert mcus[0, 3, 0] == 3
+        # EOB right after DC: every AC coefficient stays zero
+        assert not mcus[:, :, 1:].any()